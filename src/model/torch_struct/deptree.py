@@ -48,10 +48,9 @@ class DepTree(_Struct):
         for w in range(1, bound):
             n = N - w
             # two complete span form a incomplete span, also add an arc
-            # ilr = C(i->r) + C(j->r+1)
-            # [semiring, batch, n, w]
-            ilr = s.mul(stripe(C, n, w), stripe(C, n, w, (w, 1)))
-            il = ir = s.sum(ilr)
+            # ilr = logsumexp(C(i->r) + C(j->r+1)), i <= r < j
+            # [semiring, batch, n]
+            il = ir = s.dot(stripe(C, n, w), stripe(C, n, w, (w, 1)))
             # I(j->i) = logsumexp(C(i->r) + C(j->r+1)) + s(j->i), i <= r < j
             # fill the w-th diagonal of the lower triangular part of s_i
             # with I(j->i) of n spans
@@ -62,11 +61,9 @@ class DepTree(_Struct):
             I.diagonal(w, -2, -1).copy_(s.mul(ir, arc_scores.diagonal(w, -2, -1)))
 
             # C(j->i) = logsumexp(C(r->i) + I(j->r)), i <= r < j
-            cl = s.mul(stripe(C, n, w, (0, 0), 0), stripe(I, n, w, (w, 0)))
-            C.diagonal(-w, -2, -1).copy_(s.sum(cl))
+            C.diagonal(-w, -2, -1).copy_(s.dot(stripe(C, n, w, (0, 0), 0), stripe(I, n, w, (w, 0))))
             # C(i->j) = logsumexp(I(i->r) + C(r->j)), i < r <= j
-            cr = s.mul(stripe(I, n, w, (0, 1)), stripe(C, n, w, (1, w), 0))
-            C.diagonal(w, -2, -1).copy_(s.sum(cr))
+            C.diagonal(w, -2, -1).copy_(s.dot(stripe(I, n, w, (0, 1)), stripe(C, n, w, (1, w), 0)))
             # disable multi words to modify the root
             if not multiroot:
                 C[:, lengths.ne(w), 0, w] = _zero
@@ -153,8 +150,9 @@ class DepTree(_Struct):
         else:
             assert max(lengths) <= N, 'Length longer than N'
 
-        arc_scores = semiring.convert(arc_scores)
-        arc_scores = arc_scores.clone()  # avoid leaf error when backward
+        # write into a fresh chart, so the in-place masking below never touches the (leaf) input.
+        anchor = arc_scores if isinstance(arc_scores, Tensor) else arc_scores[0]
+        arc_scores = semiring.convert_into(anchor.new_empty((semiring.size(), ) + anchor.shape), arc_scores)
 
         for b in range(batch):
             semiring.zero_(arc_scores[:, b, lengths[b] + 1:, :])
@@ -47,11 +47,11 @@ class DMV1oStruct(_Struct):
         for w in range(1, N):
             n = N - w
 
-            x = s.sum(s.mul(stripe_val(C, n, w, (0, 1, NOCHILD)), stripe_val(C, n, w, (w, 1, HASCHILD))))
+            x = s.dot(stripe_val(C, n, w, (0, 1, NOCHILD)), stripe_val(C, n, w, (w, 1, HASCHILD)))
             x = s.times(x.unsqueeze(-2), attach_left.diagonal(-w, -3, -2))
             diag_minus1(I, -w, -3, -2).copy_(x)
 
-            x = s.sum(s.mul(stripe_val(C, n, w, (0, 1, HASCHILD)), stripe_val(C, n, w, (w, 1, NOCHILD))))
+            x = s.dot(stripe_val(C, n, w, (0, 1, HASCHILD)), stripe_val(C, n, w, (w, 1, NOCHILD)))
             x = s.times(x.unsqueeze(-2), attach_right.diagonal(w, -3, -2))
             I.diagonal(w + 1, -3, -2).copy_(x)
 
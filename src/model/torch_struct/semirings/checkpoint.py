@@ -1,5 +1,7 @@
 import torch
 
+from .semirings import matmul_size
+
 try:
     import genbmm
     from genbmm import BandedMatrix
@@ -11,13 +13,6 @@ def broadcast_size(a, b):
     return torch.tensor([max(i, j) for i, j in zip(a.shape, b.shape)]).prod()
 
 
-def matmul_size(a, b):
-    size = [max(i, j) for i, j in zip(a.shape[:-2], b.shape[:-2])]
-    size.append(a.shape[-2])
-    size.append(b.shape[-1])
-    return size
-
-
 def CheckpointSemiring(cls, min_size=0):
     class _Check(torch.autograd.Function):
         @staticmethod
@@ -63,6 +58,10 @@ def CheckpointSemiring(cls, min_size=0):
             else:
                 return cls.matmul(a, b)
 
+        @classmethod
+        def dot(cls, a, b):
+            return cls._matmul_dot(a, b)
+
     return _CheckpointSemiring
 
 
@@ -103,6 +102,10 @@ def CheckpointShardSemiring(cls, max_size, min_size=0):
             else:
                 return _Check.apply(a, b)
 
+        @classmethod
+        def dot(cls, a, b):
+            return cls._matmul_dot(a, b)
+
     return _CheckpointSemiring
 
 
@@ -2,7 +2,7 @@ import torch
 import torch.distributions
 
 from .sample import _SampledLogSumExp
-from .semirings import _BaseLog
+from .semirings import _BaseLog, broadcast
 
 try:
     import genbmm
@@ -10,22 +10,6 @@ except ImportError:
     pass
 
 
-def matmul_size(a, b):
-    size = [max(i, j) for i, j in zip(a.shape[:-2], b.shape[:-2])]
-    size.append(a.shape[-2])
-    size.append(b.shape[-1])
-    return size
-
-
-def broadcast(a, b):
-    size = matmul_size(a, b)
-    a = a.expand(*size[:-2], a.shape[-2], a.shape[-1])
-    b = b.expand(*size[:-2], b.shape[-2], b.shape[-1])
-    a2 = a.contiguous().view(-1, a.shape[-2], a.shape[-1])
-    b2 = b.contiguous().view(-1, b.shape[-2], b.shape[-1])
-    return a2, b2, size
-
-
 class FastLogSemiring(_BaseLog):
     """
     Implements the log-space semiring (logsumexp, +, -inf, 0).
@@ -44,6 +28,10 @@ class FastLogSemiring(_BaseLog):
             a2, b2, size = broadcast(a, b)
             return genbmm.logbmm(a2, b2).view(size)
 
+    @classmethod
+    def dot(cls, a, b):
+        return cls._matmul_dot(a, b)
+
 
 class FastMaxSemiring(_BaseLog):
     @staticmethod
@@ -55,6 +43,10 @@ class FastMaxSemiring(_BaseLog):
         a2, b2, size = broadcast(a, b)
         return genbmm.maxbmm(a2, b2).view(size)
 
+    @classmethod
+    def dot(cls, a, b):
+        return cls._matmul_dot(a, b)
+
 
 class FastSampleSemiring(_BaseLog):
     @staticmethod
@@ -65,3 +57,7 @@ class FastSampleSemiring(_BaseLog):
     def matmul(a, b, dims=1):
         a2, b2, size = broadcast(a, b)
         return genbmm.samplebmm(a2, b2).view(size)
+
+    @classmethod
+    def dot(cls, a, b):
+        return cls._matmul_dot(a, b)
@@ -17,6 +17,7 @@ class LogSemiringKO(_BaseLog):
     """
     @staticmethod
     def sum(a, dim=-1):
+        a = a.movedim(dim, -1)
         a_lazy = LazyTensor(a.unsqueeze(-1).unsqueeze(-1).contiguous())
         c = a_lazy.sum(-1).logsumexp(a.dim() - 1).squeeze(-1).squeeze(-1)
         return c
@@ -54,7 +55,7 @@ class _Max(torch.autograd.Function):
 class MaxSemiringKO(_BaseLog):
     @classmethod
     def sum(cls, xs, dim=-1):
-        assert dim == -1
+        xs = xs.movedim(dim, -1)
         return cls.dot(xs, xs.clone().fill_(0))
 
     @classmethod
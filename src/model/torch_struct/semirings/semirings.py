@@ -1,3 +1,4 @@
+import os
 from abc import ABC, abstractmethod
 from functools import reduce
 from typing import List, Union
@@ -13,8 +14,58 @@ try:
 except ImportError:
     pass
 
+# Set TORCH_STRUCT_NO_GENBMM=1 to force the pure pytorch matmul path (e.g. for debugging).
+use_genbmm = has_genbmm and os.environ.get('TORCH_STRUCT_NO_GENBMM', '').lower() not in ('true', 't', '1', 'yes', 'y')
+
 NEGINF = -1e12
 
+# 0-d constant tensors, keyed by (value, device, dtype).
+_SCALAR_CACHE = {}
+
+
+def _scalar(val, ref: Tensor, dtype=None) -> Tensor:
+    'A cached 0-d tensor holding *val* on the device and (unless given) dtype of *ref*.'
+    key = (val, ref.device, dtype or ref.dtype)
+    t = _SCALAR_CACHE.get(key)
+    if t is None:
+        # never cache an inference tensor, it could not be used by autograd later.
+        with torch.inference_mode(False):
+            t = _SCALAR_CACHE[key] = torch.tensor(val, dtype=key[2], device=ref.device)
+    return t
+
+
+def _can_genbmm(a: Tensor, b: Tensor) -> bool:
+    'Whether the dense genbmm kernels can be used on *a* and *b*.'
+    return use_genbmm and a.is_cuda and a.dim() == b.dim() and a.dim() >= 3
+
+
+def _pair_log_softmax(a: Tensor, b: Tensor):
+    'Log-partition of two log-values and their log-normalized weights.'
+    part = torch.logaddexp(a, b)
+    return part, a - part, b - part
+
+
+def matmul_size(a, b):
+    size = [max(i, j) for i, j in zip(a.shape[:-2], b.shape[:-2])]
+    size.append(a.shape[-2])
+    size.append(b.shape[-1])
+    return size
+
+
+def broadcast(a, b):
+    size = matmul_size(a, b)
+    a = a.expand(*size[:-2], a.shape[-2], a.shape[-1])
+    b = b.expand(*size[:-2], b.shape[-2], b.shape[-1])
+    a2 = a.contiguous().view(-1, a.shape[-2], a.shape[-1])
+    b2 = b.contiguous().view(-1, b.shape[-2], b.shape[-1])
+    return a2, b2, size
+
+
+def _genbmm(fn, a: Tensor, b: Tensor) -> Tensor:
+    'Flatten leading dims of *a* and *b* into one batch dim, call genbmm *fn* and restore the shape.'
+    a2, b2, size = broadcast(a, b)
+    return fn(a2, b2).view(size)
+
 
 class Semiring(ABC):
     """
@@ -54,16 +105,17 @@ class Semiring(ABC):
         'Generalized matmul.'
         a = a.unsqueeze(-1)  # ~ * n * n * 1
         b = b.unsqueeze(-3)  # ~ * 1 * n * n
-        c = cls.times(a, b)
-        c = cls.sum(c.transpose(-2, -1))
-        return c
+        return cls.sum(cls.times(a, b), dim=-2)
 
     @classmethod
     def dot(cls, a: Tensor, b: Tensor) -> Tensor:
         'Dot product along last dim.'
-        a = a.unsqueeze(-2)
-        b = b.unsqueeze(-1)
-        return cls.matmul(a, b).squeeze(-1).squeeze(-1)
+        return cls.sum(cls.mul(a, b))
+
+    @classmethod
+    def _matmul_dot(cls, a: Tensor, b: Tensor) -> Tensor:
+        'Dot product along last dim through *matmul*, for semirings with a fused or checkpointed matmul.'
+        return cls.matmul(a.unsqueeze(-2), b.unsqueeze(-1)).squeeze(-1).squeeze(-1)
 
     @staticmethod
     @abstractmethod
@@ -81,6 +133,11 @@ class Semiring(ABC):
         'Convert to semiring by adding an extra first dimension.'
         return potentials.unsqueeze(0)
 
+    @classmethod
+    def convert_into(cls, dst: Tensor, potentials: Union[Tensor, List[Tensor]]) -> Tensor:
+        'Convert to semiring by writing into the preallocated *ssize x ...* tensor *dst*.'
+        return dst.copy_(cls.convert(potentials))
+
     @classmethod
     def unconvert(cls, potentials: Tensor) -> Tensor:
         'Unconvert from semiring by removing extra first dimension.'
@@ -104,17 +161,44 @@ class Semiring(ABC):
         pass
 
 
+def _fold_times(mul, mul_, ls):
+    'Fold *ls* with *mul*, using the in-place *mul_* for operands of the same shape and dtype as the result.'
+    out = mul(ls[0], ls[1])
+    for x in ls[2:]:
+        out = mul_(out, x) if x.shape == out.shape and x.dtype == out.dtype else mul(out, x)
+    return out
+
+
 class _Base(Semiring):
     zero = 0
 
+    @classmethod
+    def plus(cls, a, b):
+        return a + b
+
+    @classmethod
+    def dot(cls, a, b):
+        return torch.einsum('...i,...i->...', a, b)
+
     @staticmethod
     def mul(a, b):
         return torch.mul(a, b)
 
+    @classmethod
+    def times(cls, *ls):
+        if len(ls) <= 2:
+            return reduce(cls.mul, ls)
+        return _fold_times(cls.mul, torch.Tensor.mul_, ls)
+
     @staticmethod
     def prod(a, dim=-1):
         return torch.prod(a, dim=dim)
 
+    @staticmethod
+    def convert_into(dst, potentials):
+        dst[0] = potentials
+        return dst
+
     @staticmethod
     def zero_(xs):
         return xs.fill_(0)
@@ -135,6 +219,12 @@ class _BaseLog(Semiring):
     def mul(a, b):
         return a + b
 
+    @classmethod
+    def times(cls, *ls):
+        if len(ls) <= 2:
+            return reduce(cls.mul, ls)
+        return _fold_times(cls.mul, torch.Tensor.add_, ls)
+
     @staticmethod
     def zero_(xs):
         return xs.fill_(NEGINF)
@@ -147,6 +237,11 @@ class _BaseLog(Semiring):
     def prod(a, dim=-1):
         return torch.sum(a, dim=dim)
 
+    @staticmethod
+    def convert_into(dst, potentials):
+        dst[0] = potentials
+        return dst
+
 
 class StdSemiring(_Base):
     """
@@ -176,10 +271,22 @@ class LogSemiring(_BaseLog):
 
     Gradients give marginals.
     """
+    @classmethod
+    def plus(cls, a, b):
+        return torch.logaddexp(a, b)
+
+    @classmethod
+    def dot(cls, a, b):
+        if _can_genbmm(a.unsqueeze(-2), b.unsqueeze(-1)):
+            return _genbmm(genbmm.logbmm, a.unsqueeze(-2), b.unsqueeze(-1)).squeeze(-1).squeeze(-1)
+        return torch.logsumexp(a + b, dim=-1)
+
     @classmethod
     def matmul(cls, a, b):
         if has_genbmm and isinstance(a, genbmm.BandedMatrix):
             return b.multiply_log(a.transpose())
+        elif _can_genbmm(a, b):
+            return _genbmm(genbmm.logbmm, a, b)
         else:
             return _BaseLog.matmul(a, b)
 
@@ -190,10 +297,21 @@ class MaxSemiring(_BaseLog):
 
     Gradients give argmax.
     """
+    @classmethod
+    def plus(cls, a, b):
+        # unlike torch.maximum, ties send the whole gradient to one side (as torch.max does).
+        return torch.where(a >= b, a, b)
+
+    @classmethod
+    def dot(cls, a, b):
+        return torch.max(a + b, dim=-1)[0]
+
     @classmethod
     def matmul(cls, a, b):
         if has_genbmm and isinstance(a, genbmm.BandedMatrix):
             return b.multiply_max(a.transpose())
+        elif _can_genbmm(a, b):
+            return _genbmm(genbmm.maxbmm, a, b)
         else:
             return super(MaxSemiring, cls).matmul(a, b)
 
@@ -204,7 +322,54 @@ class MaxSemiring(_BaseLog):
     @staticmethod
     def sparse_sum(xs, dim=-1):
         m, a = torch.max(xs, dim=dim)
-        return m, (torch.zeros(a.shape).long(), a)
+        return m, (_scalar(0, a).expand_as(a), a)
+
+
+# Candidate pairs of _KMaxMul, keyed by (k, device).
+_KMAX_PAIRS = {}
+
+
+def _kmax_pairs(k: int, ref: Tensor):
+    """
+    Indices (i, j) of the pairs that can be in the top-k of a_i + b_j.
+
+    As both k-best lists are sorted, a_i + b_j is dominated by every a_i' + b_j' with i' <= i and j' <= j,
+    so only pairs with (i + 1) * (j + 1) <= k are candidates, about k log k of them instead of k * k.
+    """
+    key = (k, ref.device)
+    pairs = _KMAX_PAIRS.get(key)
+    if pairs is None:
+        ia, ib = zip(*[(i, j) for i in range(k) for j in range(k // (i + 1))])
+        pairs = _KMAX_PAIRS[key] = (torch.tensor(ia, device=ref.device), torch.tensor(ib, device=ref.device))
+    return pairs
+
+
+class _KMaxMul(torch.autograd.Function):
+    """
+    Top-k of all pairwise sums of two sorted k-best lists.
+
+    Only the (small int) indices of the selected pairs are saved for backward,
+    so the candidate sums are freed right after the forward pass.
+    """
+    @staticmethod
+    def forward(ctx, a, b, k):
+        pair_a, pair_b = _kmax_pairs(k, a)
+        # gather from the operands before the add broadcasts them.
+        ret, idx = torch.topk(a[pair_a] + b[pair_b], k, 0)
+        index_dtype = torch.uint8 if k <= 256 else torch.long
+        ctx.save_for_backward(pair_a[idx].to(index_dtype), pair_b[idx].to(index_dtype))
+        ctx.a_shape, ctx.b_shape = a.shape, b.shape
+        return ret
+
+    @staticmethod
+    def backward(ctx, grad_output):
+        ia, ib = ctx.saved_tensors
+        grad_a = grad_b = None
+        if ctx.needs_input_grad[0]:
+            grad_a = torch.zeros_like(grad_output).scatter_add(0, ia.long(), grad_output).sum_to_size(ctx.a_shape)
+        if ctx.needs_input_grad[1]:
+            grad_b = torch.zeros_like(grad_output).scatter_add(0, ib.long(), grad_output).sum_to_size(ctx.b_shape)
+        return grad_a, grad_b, None
 
 
 def KMaxSemiring(k):
@@ -220,15 +385,16 @@ def KMaxSemiring(k):
 
         @classmethod
         def convert(cls, orig_potentials):
-            potentials = torch.zeros(
-                (k, ) + orig_potentials.shape,
-                dtype=orig_potentials.dtype,
-                device=orig_potentials.device,
-            )
-            cls.zero_(potentials)
+            potentials = orig_potentials.new_full((k, ) + orig_potentials.shape, NEGINF)
             potentials[0] = orig_potentials
             return potentials
 
+        @classmethod
+        def convert_into(cls, dst, orig_potentials):
+            dst[1:].fill_(NEGINF)
+            dst[0] = orig_potentials
+            return dst
+
         @classmethod
         def one_(cls, xs):
             cls.zero_(xs)
@@ -241,40 +407,95 @@ def KMaxSemiring(k):
 
         @staticmethod
         def sum(xs, dim=-1):
-            if dim == -1:
-                xs = xs.permute(tuple(range(1, xs.dim())) + (0, ))
-                xs = xs.contiguous().view(xs.shape[:-2] + (-1, ))
-                xs = torch.topk(xs, k, dim=-1)[0]
-                xs = xs.permute((xs.dim() - 1, ) + tuple(range(0, xs.dim() - 1)))
-                assert xs.shape[0] == k
-                return xs
-            assert False
+            assert dim != 0
+            # flatten is a view whenever the layout allows it, and the result is moved back without a copy.
+            xs = torch.topk(xs.movedim(dim, -1).movedim(0, -1).flatten(-2), k, dim=-1)[0].movedim(-1, 0)
+            assert xs.shape[0] == k
+            return xs
 
         @staticmethod
         def sparse_sum(xs, dim=-1):
             if dim == -1:
-                xs = xs.permute(tuple(range(1, xs.dim())) + (0, ))
-                xs = xs.contiguous().view(xs.shape[:-2] + (-1, ))
-                xs, xs2 = torch.topk(xs, k, dim=-1)
-                xs = xs.permute((xs.dim() - 1, ) + tuple(range(0, xs.dim() - 1)))
-                xs2 = xs2.permute((xs.dim() - 1, ) + tuple(range(0, xs.dim() - 1)))
+                xs, xs2 = torch.topk(xs.movedim(0, -1).flatten(-2), k, dim=-1)
+                xs, xs2 = xs.movedim(-1, 0), xs2.movedim(-1, 0)
                 assert xs.shape[0] == k
-                return xs, (xs2 % k, xs2 // k)
+                return xs, (xs2 % k, torch.div(xs2, k, rounding_mode='floor'))
             assert False
 
+        @classmethod
+        def times(cls, *ls):
+            return reduce(cls.mul, ls)
+
         @staticmethod
         def mul(a, b):
-            a = a.view((k, 1) + a.shape[1:])
-            b = b.view((1, k) + b.shape[1:])
-            c = a + b
-            c = c.contiguous().view((k * k, ) + c.shape[2:])
-            ret = torch.topk(c, k, 0)[0]
+            ret = _KMaxMul.apply(a, b, k)
             assert ret.shape[0] == k
             return ret
 
     return KMaxSemiring
 
 
+# Bodies of the expectation semiring sums, the softmax weights multiply the summand once.
+def _kl_sum(xs: Tensor, d: int) -> Tensor:
+    part_p = torch.logsumexp(xs[0], dim=d)
+    part_q = torch.logsumexp(xs[1], dim=d)
+    log_sm_p = xs[0] - part_p.unsqueeze(d)
+    mid = xs[2] - xs[1] + part_q.unsqueeze(d) + log_sm_p
+    return torch.stack([part_p, part_q, torch.sum(mid.mul(log_sm_p.exp()), dim=d)])
+
+
+def _cross_entropy_sum(xs: Tensor, d: int) -> Tensor:
+    part_p = torch.logsumexp(xs[0], dim=d)
+    part_q = torch.logsumexp(xs[1], dim=d)
+    sm_p = (xs[0] - part_p.unsqueeze(d)).exp()
+    mid = xs[2] - xs[1] + part_q.unsqueeze(d)
+    return torch.stack([part_p, part_q, torch.sum(mid.mul(sm_p), dim=d)])
+
+
+def _entropy_sum(xs: Tensor, d: int) -> Tensor:
+    part = torch.logsumexp(xs[0], dim=d)
+    log_sm = xs[0] - part.unsqueeze(d)
+    return torch.stack([part, torch.sum((xs[1] - log_sm).mul(log_sm.exp()), dim=d)])
+
+
+_EXPECTATION_SUMS = {'kl': _kl_sum, 'cross_entropy': _cross_entropy_sum, 'entropy': _entropy_sum}
+
+
+class _ExpectationSum(torch.autograd.Function):
+    """
+    Sum of the KL / cross-entropy / entropy semirings with an analytic backward.
+
+    Only the input and the (reduced) output are saved, the softmax weights are
+    recomputed in backward instead of keeping every intermediate on the tape.
+    """
+    @staticmethod
+    def forward(ctx, xs, d, kind):
+        out = _EXPECTATION_SUMS[kind](xs, d)
+        ctx.save_for_backward(xs, out)
+        ctx.d, ctx.kind = d, kind
+        return out
+
+    @staticmethod
+    def backward(ctx, grad_output):
+        xs, out = ctx.saved_tensors
+        d, kind = ctx.d, ctx.kind
+        g_part, g_mid = grad_output[0].unsqueeze(d), grad_output[-1].unsqueeze(d)
+        log_sm_p = xs[0] - out[0].unsqueeze(d)
+        sm_p = log_sm_p.exp()
+        if kind == 'entropy':
+            t = xs[1] - log_sm_p
+        else:
+            log_sm_q = xs[1] - out[1].unsqueeze(d)
+            t = xs[2] - log_sm_q + log_sm_p if kind == 'kl' else xs[2] - log_sm_q
+        grad_p = sm_p.mul(g_part + g_mid.mul(t - out[-1].unsqueeze(d)))
+        grad_mid = g_mid.mul(sm_p)
+        if kind == 'entropy':
+            return torch.stack((grad_p, grad_mid)), None, None
+        sm_q = log_sm_q.exp()
+        grad_q = grad_output[1].unsqueeze(d).mul(sm_q) + g_mid.mul(sm_q - sm_p)
+        return torch.stack((grad_p, grad_q, grad_mid)), None, None
+
+
 class KLDivergenceSemiring(Semiring):
     """
     Implements an KL-divergence semiring.
@@ -296,11 +517,14 @@ class KLDivergenceSemiring(Semiring):
 
     @classmethod
     def convert(cls, xs):
-        values = torch.zeros((3, ) + xs[0].shape).type_as(xs[0])
-        values[0] = xs[0]
-        values[1] = xs[1]
-        values[2] = 0
-        return values
+        return cls.convert_into(xs[0].new_empty((3, ) + xs[0].shape), xs)
+
+    @classmethod
+    def convert_into(cls, dst, xs):
+        dst[0] = xs[0]
+        dst[1] = xs[1]
+        dst[2].fill_(0)
+        return dst
 
     @classmethod
     def unconvert(cls, xs):
@@ -310,13 +534,15 @@ class KLDivergenceSemiring(Semiring):
     def sum(xs, dim=-1):
         assert dim != 0
         d = dim - 1 if dim > 0 else dim
-        part_p = torch.logsumexp(xs[0], dim=d)
-        part_q = torch.logsumexp(xs[1], dim=d)
-        log_sm_p = xs[0] - part_p.unsqueeze(d)
-        log_sm_q = xs[1] - part_q.unsqueeze(d)
-        sm_p = log_sm_p.exp()
-        return torch.stack((part_p, part_q, torch.sum(xs[2].mul(sm_p) - log_sm_q.mul(sm_p) + log_sm_p.mul(sm_p),
-                                                      dim=d)))
+        return _ExpectationSum.apply(xs, d, 'kl')
+
+    @classmethod
+    def plus(cls, a, b):
+        part_p, log_sm_pa, log_sm_pb = _pair_log_softmax(a[0], b[0])
+        part_q, log_sm_qa, log_sm_qb = _pair_log_softmax(a[1], b[1])
+        sm_pa, sm_pb = log_sm_pa.exp(), log_sm_pb.exp()
+        return torch.stack((part_p, part_q, (a[2] - log_sm_qa + log_sm_pa).mul(sm_pa) +
+                            (b[2] - log_sm_qb + log_sm_pb).mul(sm_pb)))
 
     @staticmethod
     def mul(a, b):
@@ -329,23 +555,18 @@ class KLDivergenceSemiring(Semiring):
     @classmethod
     def zero_mask_(cls, xs, mask):
         'Fill *ssize x ...* tensor with additive identity.'
-        xs[0].masked_fill_(mask, NEGINF)
-        xs[1].masked_fill_(mask, NEGINF)
+        xs[:2].masked_fill_(mask, NEGINF)
         xs[2].masked_fill_(mask, 0)
 
     @staticmethod
     def zero_(xs):
-        xs[0].fill_(NEGINF)
-        xs[1].fill_(NEGINF)
+        xs[:2].fill_(NEGINF)
         xs[2].fill_(0)
         return xs
 
     @staticmethod
     def one_(xs):
-        xs[0].fill_(0)
-        xs[1].fill_(0)
-        xs[2].fill_(0)
-        return xs
+        return xs.fill_(0)
 
 
 class CrossEntropySemiring(Semiring):
@@ -370,11 +591,14 @@ class CrossEntropySemiring(Semiring):
 
     @classmethod
     def convert(cls, xs):
-        values = torch.zeros((3, ) + xs[0].shape).type_as(xs[0])
-        values[0] = xs[0]
-        values[1] = xs[1]
-        values[2] = 0
-        return values
+        return cls.convert_into(xs[0].new_empty((3, ) + xs[0].shape), xs)
+
+    @classmethod
+    def convert_into(cls, dst, xs):
+        dst[0] = xs[0]
+        dst[1] = xs[1]
+        dst[2].fill_(0)
+        return dst
 
     @classmethod
     def unconvert(cls, xs):
@@ -384,12 +608,14 @@ class CrossEntropySemiring(Semiring):
     def sum(cls, xs, dim=-1):
         assert dim != 0
         d = dim - 1 if dim > 0 else dim
-        part_p = torch.logsumexp(xs[0], dim=d)
-        part_q = torch.logsumexp(xs[1], dim=d)
-        log_sm_p = xs[0] - part_p.unsqueeze(d)
-        log_sm_q = xs[1] - part_q.unsqueeze(d)
-        sm_p = log_sm_p.exp()
-        return torch.stack((part_p, part_q, torch.sum(xs[2].mul(sm_p) - log_sm_q.mul(sm_p), dim=d)))
+        return _ExpectationSum.apply(xs, d, 'cross_entropy')
+
+    @classmethod
+    def plus(cls, a, b):
+        part_p, log_sm_pa, log_sm_pb = _pair_log_softmax(a[0], b[0])
+        part_q, log_sm_qa, log_sm_qb = _pair_log_softmax(a[1], b[1])
+        return torch.stack((part_p, part_q, (a[2] - log_sm_qa).mul(log_sm_pa.exp()) +
+                            (b[2] - log_sm_qb).mul(log_sm_pb.exp())))
 
     @classmethod
     def mul(cls, a, b):
@@ -402,23 +628,18 @@ class CrossEntropySemiring(Semiring):
     @classmethod
     def zero_mask_(cls, xs, mask):
         'Fill *ssize x ...* tensor with additive identity.'
-        xs[0].masked_fill_(mask, NEGINF)
-        xs[1].masked_fill_(mask, NEGINF)
+        xs[:2].masked_fill_(mask, NEGINF)
         xs[2].masked_fill_(mask, 0)
 
     @staticmethod
     def zero_(xs):
-        xs[0].fill_(NEGINF)
-        xs[1].fill_(NEGINF)
+        xs[:2].fill_(NEGINF)
         xs[2].fill_(0)
         return xs
 
     @staticmethod
     def one_(xs):
-        xs[0].fill_(0)
-        xs[1].fill_(0)
-        xs[2].fill_(0)
-        return xs
+        return xs.fill_(0)
 
 
 class EntropySemiring(Semiring):
@@ -443,10 +664,13 @@ class EntropySemiring(Semiring):
 
     @classmethod
     def convert(cls, xs):
-        values = torch.zeros((2, ) + xs.shape).type_as(xs)
-        values[0] = xs
-        values[1] = 0
-        return values
+        return cls.convert_into(xs.new_empty((2, ) + xs.shape), xs)
+
+    @classmethod
+    def convert_into(cls, dst, xs):
+        dst[0] = xs
+        dst[1].fill_(0)
+        return dst
 
     @classmethod
     def unconvert(cls, xs):
@@ -456,10 +680,12 @@ class EntropySemiring(Semiring):
     def sum(xs, dim=-1):
         assert dim != 0
         d = dim - 1 if dim > 0 else dim
-        part = torch.logsumexp(xs[0], dim=d)
-        log_sm = xs[0] - part.unsqueeze(d)
-        sm = log_sm.exp()
-        return torch.stack((part, torch.sum(xs[1].mul(sm) - log_sm.mul(sm), dim=d)))
+        return _ExpectationSum.apply(xs, d, 'entropy')
+
+    @classmethod
+    def plus(cls, a, b):
+        part, log_sm_a, log_sm_b = _pair_log_softmax(a[0], b[0])
+        return torch.stack((part, (a[1] - log_sm_a).mul(log_sm_a.exp()) + (b[1] - log_sm_b).mul(log_sm_b.exp())))
 
     @staticmethod
     def mul(a, b):
@@ -483,9 +709,7 @@ class EntropySemiring(Semiring):
 
     @staticmethod
     def one_(xs):
-        xs[0].fill_(0)
-        xs[1].fill_(0)
-        return xs
+        return xs.fill_(0)
 
 
 def TempMax(alpha):
@@ -501,7 +725,7 @@ def TempMax(alpha):
         def sparse_sum(xs, dim=-1):
             m, _ = torch.max(xs, dim=dim)
             a = torch.softmax(alpha * xs, dim)
-            return m, (torch.zeros(a.shape[:-1]).long(), a)
+            return m, (_scalar(0, a, torch.long).expand(a.shape[:-1]), a)
 
     return _TempMax
 
@@ -516,11 +740,14 @@ class RiskSemiring(Semiring):
 
     @classmethod
     def convert(cls, xs):
-        values = torch.zeros((3, ) + xs[0].shape).type_as(xs[0])
-        values[0] = xs[0]
-        values[1] = xs[1]
-        values[2] = 0
-        return values
+        return cls.convert_into(xs[0].new_empty((3, ) + xs[0].shape), xs)
+
+    @classmethod
+    def convert_into(cls, dst, xs):
+        dst[0] = xs[0]
+        dst[1] = xs[1]
+        dst[2].fill_(0)
+        return dst
 
     @classmethod
     def unconvert(cls, xs):
@@ -531,9 +758,15 @@ class RiskSemiring(Semiring):
         assert dim != 0
         d = dim - 1 if dim > 0 else dim
         part_p = torch.logsumexp(xs[0], dim=d)
-        log_sm_p = xs[0] - part_p.unsqueeze(d)
-        sm_p = log_sm_p.exp()
-        return torch.stack((part_p, torch.zeros_like(part_p), torch.sum((xs[1] + xs[2]).mul(sm_p), dim=d)))
+        # softmax keeps only its output for backward, instead of both log_sm_p and sm_p.
+        sm_p = torch.softmax(xs[0], dim=d)
+        return torch.stack((part_p, _scalar(0, part_p).expand_as(part_p), torch.sum((xs[1] + xs[2]).mul(sm_p), dim=d)))
+
+    @classmethod
+    def plus(cls, a, b):
+        part_p, log_sm_pa, log_sm_pb = _pair_log_softmax(a[0], b[0])
+        return torch.stack((part_p, _scalar(0, part_p).expand_as(part_p), (a[1] + a[2]).mul(log_sm_pa.exp()) +
+                            (b[1] + b[2]).mul(log_sm_pb.exp())))
 
     @classmethod
     def mul(cls, a, b):
@@ -547,19 +780,14 @@ class RiskSemiring(Semiring):
     def zero_mask_(cls, xs, mask):
         'Fill *ssize x ...* tensor with additive identity.'
         xs[0].masked_fill_(mask, NEGINF)
-        xs[1].masked_fill_(mask, 0)
-        xs[2].masked_fill_(mask, 0)
+        xs[1:].masked_fill_(mask, 0)
 
     @staticmethod
     def zero_(xs):
         xs[0].fill_(NEGINF)
-        xs[1].fill_(0)
-        xs[2].fill_(0)
+        xs[1:].fill_(0)
         return xs
 
     @staticmethod
     def one_(xs):
-        xs[0].fill_(0)
-        xs[1].fill_(0)
-        xs[2].fill_(0)
-        return xs
+        return xs.fill_(0)